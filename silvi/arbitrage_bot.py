@@ -1,25 +1,430 @@
-import requests
+import asyncio
+import atexit
+import functools
+import importlib
+import aiohttp
 import time
-import json
-from datetime import datetime
-from typing import Dict, List, Tuple, Optional
+import ijson
+import orjson
+from datetime import datetime, timezone
+from enum import IntEnum
+from typing import Callable, Dict, Iterable, Iterator, List, Set, Tuple, Optional
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import math
+import mmap
+import msgpack
+import numpy as np
 import os
+import queue
+import threading
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
+try:
+    import uvloop
+except ImportError:  # uvloop is not available on Windows
+    uvloop = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # Only needed to export odds history
+    pa = None
+
 # Load environment variables
 load_dotenv()
 
-# Configure logging
+# Configure logging; records are queued and written by a background listener thread
+# so logging never blocks odds processing or bet placement on disk I/O
+_log_queue = queue.Queue(-1)
+_log_listener = QueueListener(
+    _log_queue,
+    RotatingFileHandler('arbitrage.log', maxBytes=10_000_000, backupCount=5),
+    logging.StreamHandler()
+)
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('arbitrage.log'),
-        logging.StreamHandler()
+    handlers=[QueueHandler(_log_queue)]
+)
+_log_listener.start()
+atexit.register(_log_listener.stop)
+
+# Sports monitored by the bot
+SPORTS = ['football', 'tennis', 'basketball']
+
+# Bookmakers compared for arbitrage, keyed by the name used in method names
+BOOKMAKERS = {
+    'pinnacle': 'Pinnacle',
+    'betfair': 'Betfair',
+    'draftkings': 'DraftKings',
+    'fanduel': 'FanDuel',
+    'williamhill': 'William Hill'
+}
+
+# Column of each bookmaker in the odds matrix
+BOOK_COLUMNS = {book: column for column, book in enumerate(BOOKMAKERS)}
+BOOK_NAMES = list(BOOKMAKERS)
+
+class Sport(IntEnum):
+    FOOTBALL = 0
+    TENNIS = 1
+    BASKETBALL = 2
+
+# Sport IDs used by each bookmaker's API, indexed by Sport
+PINNACLE_IDS = [29, 33, 4]
+BETFAIR_IDS = [1, 2, 7522]
+DRAFTKINGS_IDS = ['NFL', 'TENNIS', 'NBA']
+FANDUEL_IDS = ['american-football', 'tennis', 'basketball']
+
+# Fields read by the matcher; everything else in an odds payload is dropped while parsing
+_EVENT_FIELDS = ('event', 'home', 'away', 'sport', 'marketId')
+_MARKET_FIELDS = ('name', 'type', 'selection', 'line', 'odds')
+
+# Concurrent odds requests allowed per bookmaker
+BOOK_CONCURRENCY = {
+    'pinnacle': 4,
+    'betfair': 8,
+    'draftkings': 4,
+    'fanduel': 4,
+    'williamhill': 4
+}
+
+# Seconds each bookmaker's odds requests may take, per request and for the book's whole poll,
+# so one stalled bookmaker cannot hold up the polling tick
+BOOK_TIMEOUT = {
+    'pinnacle': 5.0,
+    'betfair': 8.0,
+    'draftkings': 5.0,
+    'fanduel': 5.0,
+    'williamhill': 5.0
+}
+
+# Extra attempts for a bet request that fails to connect
+BET_RETRIES = 2
+
+# Seconds a bet or cancel request may take in total; a request that runs over raises a timeout,
+# leaving its outcome unknown, so the arbitrage is rolled back instead of waiting on a hung leg
+BET_TIMEOUT = 3.0
+
+# Most market IDs Betfair accepts in one listMarketBook request
+BETFAIR_MARKET_BATCH = 40
+
+# Largest single stream message accepted; initial market images run to several megabytes
+STREAM_MESSAGE_LIMIT = 64 * 1024 * 1024
+
+# Seconds between polling ticks, measured start to start
+POLL_INTERVAL = 30.0
+
+# Longest a failing bookmaker is left unpolled before it is tried again
+MAX_RETRY_DELAY = 300.0
+
+# Polled quotes fetched further apart than this are never paired, so a price that moved
+# between two reads cannot produce a phantom arbitrage
+STALENESS_NS = 500_000_000
+
+# Polled quotes not confirmed for this long are too old to bet on
+QUOTE_MAX_AGE_NS = int(2 * POLL_INTERVAL * 1e9)
+
+# Each kind of error is logged in full at most once per interval, and counted in between
+ERROR_LOG_INTERVAL = 60.0
+
+# Seconds between sweeps that forget event and market IDs no longer in use
+SYMBOL_PRUNE_INTERVAL = 300.0
+
+# Streamed odds older than this (no message or heartbeat) fall back to REST
+STREAM_STALE_AFTER = 60.0
+
+class _FrozenSlots:
+    """Pickle/copy support for frozen dataclasses that declare __slots__"""
+    __slots__ = ()
+
+    def __getstate__(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __setstate__(self, state):
+        # Frozen instances reject setattr, so restore each slot directly
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+
+@dataclass(frozen=True)
+class Leg(_FrozenSlots):
+    __slots__ = ('book', 'odds', 'stake')
+    book: str
+    odds: float
+    stake: float
+
+@dataclass(frozen=True)
+class Opportunity(_FrozenSlots):
+    __slots__ = ('event', 'market', 'leg1', 'leg2', 'profit_percentage', 'potential_profit', 'timestamp')
+    event: str
+    market: str
+    leg1: Leg
+    leg2: Leg
+    profit_percentage: float
+    potential_profit: float
+    timestamp: datetime
+
+    def bet_details(self, leg: Leg) -> Dict:
+        """Bet request payload for one leg of the opportunity"""
+        return {
+            'event': self.event,
+            'market': self.market,
+            'odds': leg.odds,
+            'stake': leg.stake,
+            'idempotency_key': str(uuid.uuid4())
+        }
+
+class Circuit(IntEnum):
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+class CircuitState:
+    """Circuit breaker for one bookmaker's odds endpoint"""
+    __slots__ = ('state', 'consecutive_failures', 'open_until')
+
+    def __init__(self):
+        self.state = Circuit.CLOSED
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def allow(self) -> bool:
+        """Whether a request may go out; an expired open circuit lets one trial through"""
+        if self.state is Circuit.OPEN and time.monotonic() >= self.open_until:
+            self.state = Circuit.HALF_OPEN
+        return self.state is not Circuit.OPEN
+
+    def record_success(self):
+        self.state = Circuit.CLOSED
+        self.consecutive_failures = 0
+
+    def record_failure(self) -> float:
+        """Open the circuit with exponential backoff; returns the seconds until the next trial"""
+        self.consecutive_failures += 1
+        delay = min(POLL_INTERVAL * 2 ** (self.consecutive_failures - 1), MAX_RETRY_DELAY)
+        self.state = Circuit.OPEN
+        self.open_until = time.monotonic() + delay
+        return delay
+
+class OddsHistory:
+    """Fixed-size columnar ring buffer of recent quotes; the oldest rows are overwritten first"""
+    __slots__ = ('ts', 'event_id', 'market_id', 'bookmaker_id', 'odds', 'head', 'count')
+
+    def __init__(self, slots: int):
+        self.ts = np.zeros(slots, dtype=np.int64)
+        self.event_id = np.zeros(slots, dtype=np.int64)
+        self.market_id = np.zeros(slots, dtype=np.int64)
+        self.bookmaker_id = np.zeros(slots, dtype=np.int8)
+        self.odds = np.zeros(slots, dtype=np.float64)
+        self.head = 0
+        self.count = 0
+
+    def append(self, ts: int, event_ids: List[int], market_ids: List[int], bookmaker_id: int, odds: List[float]):
+        """Append one bookmaker's quotes in bulk"""
+        slots = self.odds.shape[0]
+        n = len(odds)
+        if n == 0:
+            return
+        if n > slots:
+            event_ids, market_ids, odds = event_ids[-slots:], market_ids[-slots:], odds[-slots:]
+            n = slots
+        index = (self.head + np.arange(n)) % slots
+        self.ts[index] = ts
+        self.event_id[index] = event_ids
+        self.market_id[index] = market_ids
+        self.bookmaker_id[index] = bookmaker_id
+        self.odds[index] = odds
+        self.head = (self.head + n) % slots
+        self.count = min(self.count + n, slots)
+
+    def symbols(self) -> Set[int]:
+        """Event and market IDs still referenced by buffered quotes"""
+        index = (self.head - self.count + np.arange(self.count)) % self.odds.shape[0]
+        return set(np.unique(self.event_id[index]).tolist()) | set(np.unique(self.market_id[index]).tolist())
+
+    def table(self) -> 'pa.Table':
+        """The buffered quotes as an Arrow table, oldest first"""
+        index = (self.head - self.count + np.arange(self.count)) % self.odds.shape[0]
+        return pa.table({
+            'ts': pa.array(self.ts[index], type=pa.timestamp('ns', tz='UTC')),
+            'event_id': self.event_id[index],
+            'market_id': self.market_id[index],
+            'bookmaker_id': self.bookmaker_id[index],
+            'odds': self.odds[index]
+        })
+
+def _cancel_request(bet_details: Dict) -> Dict:
+    """
+    Cancel payload for a placed bet: it names the placement by its idempotency key and
+    carries a fresh key of its own, so the bookmaker never mistakes it for a replayed placement
+    """
+    return {
+        'event': bet_details['event'],
+        'market': bet_details['market'],
+        'bet_idempotency_key': bet_details['idempotency_key'],
+        'idempotency_key': str(uuid.uuid4())
+    }
+
+def _dumps(obj) -> str:
+    """Serialize to a JSON string with orjson"""
+    return orjson.dumps(obj).decode()
+
+async def _read_json(response: aiohttp.ClientResponse):
+    """Parse a response body with orjson"""
+    return orjson.loads(await response.read())
+
+def _slim_event(event: Dict) -> Dict:
+    """Keep only the event and market fields used for matching"""
+    slim = {key: event[key] for key in _EVENT_FIELDS if key in event}
+    slim['markets'] = [
+        {key: market[key] for key in _MARKET_FIELDS if key in market}
+        for market in event.get('markets', [])
+    ]
+    return slim
+
+async def _read_events(response: aiohttp.ClientResponse, prefix: str) -> List[Dict]:
+    """Stream-parse the events under prefix without materializing the whole payload"""
+    return [
+        _slim_event(event)
+        async for event in ijson.items_async(response.content, prefix, use_float=True)
     ]
+
+# Shared HTTP session for odds fetching, created lazily inside the event loop
+_session: Optional[aiohttp.ClientSession] = None
+
+async def get_session() -> aiohttp.ClientSession:
+    """Return the shared aiohttp session, creating it on first use"""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=32, limit_per_host=8, use_dns_cache=True, ttl_dns_cache=300, keepalive_timeout=75
+            ),
+            json_serialize=_dumps
+        )
+    return _session
+
+# Bet placement keeps its own session so placements never queue behind odds fetches
+_bet_session: Optional[aiohttp.ClientSession] = None
+
+async def get_bet_session() -> aiohttp.ClientSession:
+    """Return the shared bet placement session, creating it on first use"""
+    global _bet_session
+    if _bet_session is None or _bet_session.closed:
+        _bet_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=16, use_dns_cache=True, ttl_dns_cache=300, keepalive_timeout=120
+            ),
+            timeout=aiohttp.ClientTimeout(total=BET_TIMEOUT),
+            json_serialize=_dumps
+        )
+    return _bet_session
+
+# Bet placement hosts, kept connected so a placement never waits on a TLS handshake
+BET_HOSTS = (
+    'https://api.pinnacle.com',
+    'https://api.betfair.com',
+    'https://api.draftkings.com',
+    'https://api.fanduel.com',
+    'https://api.williamhill.com'
 )
 
+async def warm_bet_connections(record_error: Callable[[str, Exception], None]):
+    """Open or refresh a pooled connection to every bet placement host, counting failures through record_error"""
+    session = await get_bet_session()
+    
+    async def touch(host: str):
+        try:
+            async with session.head(host, timeout=aiohttp.ClientTimeout(total=5)):
+                pass
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            record_error(f"bet connection warm-up to {host}", e)
+    
+    await asyncio.gather(*(touch(host) for host in BET_HOSTS))
+
+async def close_session():
+    """Close the shared aiohttp sessions"""
+    global _session, _bet_session
+    for session in (_session, _bet_session):
+        if session is not None and not session.closed:
+            await session.close()
+    _session = None
+    _bet_session = None
+
+def ttl_cached(fetcher):
+    """Cache an odds fetcher's results per sport in the finder's TTL cache
+
+    Each sport's events come back as (events, fetched_ns), fetched_ns being the
+    time.monotonic_ns() they arrived at; cached results keep their original
+    stamp, so a cached price is never passed off as a fresh read. Only sports
+    missing from the cache are fetched. Empty results are not cached, so the
+    next call retries straight away.
+    """
+    @functools.wraps(fetcher)
+    async def wrapper(self, session: aiohttp.ClientSession,
+                      sports: List[Sport]) -> Dict[Sport, Tuple[List[Dict], int]]:
+        odds = {}
+        with self._odds_cache_lock:
+            for sport in sports:
+                cached = self._odds_cache.get((fetcher.__name__, sport))
+                if cached is not None:
+                    odds[sport] = cached
+        missing = [sport for sport in sports if sport not in odds]
+        if missing:
+            fetched = await fetcher(self, session, missing)
+            fetched_ns = time.monotonic_ns()
+            with self._odds_cache_lock:
+                for sport, events in fetched.items():
+                    odds[sport] = (events, fetched_ns)
+                    if events:
+                        self._odds_cache[(fetcher.__name__, sport)] = odds[sport]
+        return odds
+    return wrapper
+
+def _event_key(sport: Sport, event: Dict) -> Tuple:
+    """Canonical key identifying the same event across bookmakers"""
+    home, away = event.get('home'), event.get('away')
+    if home is None or away is None:
+        home, _, away = event['event'].partition(' vs ')
+    return (sport, home.strip().lower(), away.strip().lower())
+
+def _market_key(market: Dict) -> Tuple:
+    """Canonical key identifying the same market selection across bookmakers"""
+    return (market.get('type', market['name']).strip().lower(), market.get('selection'), market.get('line'))
+
+def _checked_odds(value) -> float:
+    """Decimal odds as a float; raises for missing, non-numeric, non-finite or <= 1.0 prices"""
+    odds = float(value)
+    if not math.isfinite(odds) or odds <= 1.0:
+        raise ValueError(f"unusable odds {value!r}")
+    return odds
+
+def _screen_arbitrage(inv: np.ndarray, min_profit_threshold: float,
+                      max_stake: float) -> Tuple[np.ndarray, ...]:
+    """
+    Detect arbitrage and size stakes over an (n, 2) array of paired implied probabilities
+    Returns: (hit_indices, profit_percentages, stakes, potential_profits) for the hits only,
+    stakes shaped (hits, 2)
+    """
+    inv_sum = inv.sum(axis=1)
+    profit = (1.0 - inv_sum) * 100.0
+    hits = np.flatnonzero(profit > min_profit_threshold)
+    total_stake = min(max_stake, 1000)  # Limit maximum stake
+    stakes = total_stake * inv[hits] / inv_sum[hits, None]
+    return hits, profit[hits], stakes, total_stake * profit[hits] / 100.0
+
+def _sport_from_id(book_ids: List, sport_id) -> Optional[Sport]:
+    """Convert a bookmaker's sport ID back to a Sport"""
+    for sport in Sport:
+        if str(book_ids[sport]) == str(sport_id):
+            return sport
+    return None
+
 class ArbitrageFinder:
     def __init__(self):
         self.api_keys = {
@@ -32,626 +437,1113 @@ class ArbitrageFinder:
         }
         self.min_profit_threshold = float(os.getenv('MIN_PROFIT_THRESHOLD', '1.0'))
         self.max_stake = float(os.getenv('MAX_STAKE', '100.0'))
+        self._stream_last_seen: Dict[str, float] = {}
+        self._betfair_markets: Dict[str, Tuple[Sport, str, str]] = {}
+        # Runner names per streamed Betfair market by selection ID, from the market catalogue; stream
+        # runner changes only carry selection IDs, which never match other books' market names
+        self._betfair_runners: Dict[str, Dict[int, str]] = {}
+        # Streamed markets awaiting a catalogue lookup, and their latest prices until it lands
+        self._betfair_unnamed: Set[str] = set()
+        self._betfair_unnamed_prices: Dict[Tuple[str, int], Tuple[float, float]] = {}
+        self._betfair_naming = asyncio.Event()
+        # Streamed quotes as (book, sport, quote), waiting to be applied to the market index
+        self.updates: asyncio.Queue = asyncio.Queue()
+        # Compact integer IDs for event keys and (event ID, market key) pairs; the market index
+        # and everything keyed by market use these IDs rather than the nested string tuples
+        self._symbols: Dict[Tuple, int] = {}
+        # Key behind each live ID; pruning removes entries from both maps, and IDs are never reused
+        self._symbol_names: Dict[int, Tuple] = {}
+        self._next_symbol = 0
+        # Latest quote per market ID -> book, from streams and polling alike
+        self.market_index: Dict[int, Dict[str, Dict]] = {}
+        # Odds matrix with one row per market and one column per bookmaker; 0 means no quote
+        self._odds = np.zeros((256, len(BOOKMAKERS)))
+        # When each quote was last received or confirmed, as time.monotonic_ns()
+        self._quote_ns = np.zeros(self._odds.shape, dtype=np.int64)
+        # Whether each quote came from a stream (kept current while it is live) or from polling
+        self._streamed = np.zeros(self._odds.shape, dtype=np.bool_)
+        self._market_rows: Dict[int, int] = {}
+        self._free_rows = list(range(255, -1, -1))
+        # Recent quotes in columnar form for analytics
+        self._history = OddsHistory(int(os.getenv('ODDS_HISTORY_SLOTS', '262144')))
+        # Markets last polled per (book, sport), to drop quotes a bookmaker stops offering
+        self._polled_keys: Dict[Tuple[str, Sport], Set[int]] = {}
+        self._emitted: Dict[int, Tuple[Leg, Leg]] = {}
+        # Markets whose best pair would be an arbitrage but was read too far apart or too long ago;
+        # they are rechecked whenever one of their quotes is confirmed again, even at the same price
+        self._stale: Set[int] = set()
+        # Recent REST odds per (fetcher, sport), kept roughly as long as books take to republish
+        self._odds_cache = TTLCache(maxsize=64, ttl=float(os.getenv('ODDS_CACHE_TTL', '2.0')))
+        self._odds_cache_lock = threading.Lock()
+        # Last ETag and parsed events per odds request, so unchanged payloads are not re-downloaded
+        self._etags: Dict[Tuple, Tuple[str, List[Dict]]] = {}
+        # Per-bookmaker request limits so one slow book cannot take every pooled connection
+        self._limits = {book: asyncio.Semaphore(limit) for book, limit in BOOK_CONCURRENCY.items()}
+        # Error counts per (source, error class) since the last report, and when each was last logged in full
+        self._error_counts: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._error_logged: Dict[Tuple[str, str], float] = {}
+        # Per-bookmaker circuit breakers, so a dead endpoint costs nothing until its backoff expires
+        self._breakers = {book: CircuitState() for book in BOOKMAKERS}
+        # Optional append-only msgpack record of every odds refresh, for replay and backtesting
+        snapshot_path = os.getenv('ODDS_SNAPSHOT_FILE')
+        self._snapshot_file = open(snapshot_path, 'ab') if snapshot_path else None
+        self._snapshot_packer = msgpack.Packer(use_bin_type=True)
+        # One writer thread packs and appends records in order, off the event loop
+        self._snapshot_writer = ThreadPoolExecutor(1, thread_name_prefix='odds-snapshot') if snapshot_path else None
+        # Odds fetching, bet placement and cancellation methods keyed by bookmaker
+        self._fetchers = self._methods_by_book('get_odds_')
+        self._placers = self._methods_by_book('place_bet_')
+        self._batch_placers = self._methods_by_book('place_bets_')
+        self._cancellers = self._methods_by_book('cancel_bet_')
 
-    def get_odds_pinnacle(self, sport: str) -> List[Dict]:
-        """Fetch odds from Pinnacle Sports API"""
-        try:
-            headers = {
-                'Authorization': f'Bearer {self.api_keys["pinnacle"]}',
-                'Accept': 'application/json'
-            }
+    def record_error(self, source: str, error: Exception):
+        """Count an error, logging it in full only once per ERROR_LOG_INTERVAL for each source and error class"""
+        key = (source, type(error).__name__)
+        self._error_counts[key] += 1
+        now = time.monotonic()
+        last_logged = self._error_logged.get(key)
+        if last_logged is None or now - last_logged >= ERROR_LOG_INTERVAL:
+            self._error_logged[key] = now
+            logging.error("Error from %s: %s", source, error, exc_info=error)
+
+    async def report_errors(self):
+        """Log how often each error recurred, once per ERROR_LOG_INTERVAL"""
+        while True:
+            await asyncio.sleep(ERROR_LOG_INTERVAL)
+            counts, self._error_counts = self._error_counts, defaultdict(int)
+            for (source, error), count in counts.items():
+                logging.warning("%d %s errors from %s in the last %.0fs", count, error, source, ERROR_LOG_INTERVAL)
+
+    def _methods_by_book(self, prefix: str) -> Dict[str, Callable]:
+        """Bound methods named prefix + bookmaker, keyed by bookmaker"""
+        return {
+            name[len(prefix):]: getattr(self, name)
+            for name in type(self).__dict__
+            if name.startswith(prefix)
+        }
+
+    async def _fetch_each_sport(self, book: str, fetch, sports: List[Sport]) -> Dict[Sport, List[Dict]]:
+        """
+        Run a single-sport fetch for each sport concurrently, for bookmakers without a bulk endpoint
+        Sports that fail come back empty; if every sport fails the first error is raised
+        """
+        errors = []
+        
+        async def fetch_one(sport: Sport):
+            try:
+                return sport, await fetch(sport)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, ijson.JSONError) as e:
+                self.record_error(f"{BOOKMAKERS[book]} {sport.name.lower()} odds", e)
+                errors.append(e)
+                return sport, []
+        
+        odds = dict(await asyncio.gather(*(fetch_one(sport) for sport in sports)))
+        if errors and len(errors) == len(sports):
+            raise errors[0]
+        return odds
+
+    async def _get_events(self, book: str, session: aiohttp.ClientSession, url: str, prefix: str,
+                          params: Optional[Dict] = None, headers: Optional[Dict] = None) -> List[Dict]:
+        """GET and stream-parse a bookmaker's events, reusing the last parse when the ETag still matches"""
+        key = (url, tuple(sorted((params or {}).items())))
+        cached = self._etags.get(key)
+        if cached is not None:
+            headers = {**(headers or {}), 'If-None-Match': cached[0]}
+        async with self._limits[book], session.get(
+            url, params=params, headers=headers, timeout=aiohttp.ClientTimeout(total=BOOK_TIMEOUT[book])
+        ) as response:
+            if response.status == 304 and cached is not None:
+                return cached[1]
+            response.raise_for_status()
+            events = await _read_events(response, prefix)
+            etag = response.headers.get('ETag')
+        if etag:
+            self._etags[key] = (etag, events)
+        else:
+            self._etags.pop(key, None)
+        return events
+
+    @ttl_cached
+    async def get_odds_pinnacle(self, session: aiohttp.ClientSession, sports: List[Sport]) -> Dict[Sport, List[Dict]]:
+        """Fetch odds from Pinnacle Sports API, one request per sport"""
+        headers = {
+            'Authorization': f'Bearer {self.api_keys["pinnacle"]}',
+            'Accept': 'application/json'
+        }
+        
+        async def fetch(sport: Sport) -> List[Dict]:
             # Pinnacle API v1 endpoint for sports odds
-            response = requests.get(
-                'https://api.pinnacle.com/v2/odds',
-                params={'sportId': self._get_sport_id(sport).get('pinnacle'), 'oddsFormat': 'DECIMAL'},
+            return await self._get_events(
+                'pinnacle', session, 'https://api.pinnacle.com/v2/odds', 'leagues.item',
+                params={'sportId': PINNACLE_IDS[sport], 'oddsFormat': 'DECIMAL'},
                 headers=headers
             )
-            response.raise_for_status()
-            return response.json().get('leagues', [])
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching Pinnacle odds: {e}")
-            return []
+        
+        return await self._fetch_each_sport('pinnacle', fetch, sports)
 
-    def get_odds_betfair(self, sport: str) -> List[Dict]:
-        """Fetch odds from Betfair Exchange API"""
-        try:
-            headers = {
-                'X-Application': self.api_keys["betfair"],
-                'X-Authentication': os.getenv('BETFAIR_SESSION_TOKEN'),
-                'Accept': 'application/json'
-            }
-            # First get event IDs for the sport
-            response = requests.post(
+    @ttl_cached
+    async def get_odds_betfair(self, session: aiohttp.ClientSession, sports: List[Sport]) -> Dict[Sport, List[Dict]]:
+        """Fetch odds from Betfair Exchange API, sharing market book batches across sports"""
+        headers = {
+            'X-Application': self.api_keys["betfair"],
+            'X-Authentication': os.getenv('BETFAIR_SESSION_TOKEN'),
+            'Accept': 'application/json'
+        }
+        
+        async def list_events(sport: Sport) -> List[Dict]:
+            async with self._limits['betfair'], session.post(
                 'https://api.betfair.com/exchange/betting/rest/v1.0/listEvents/',
                 headers=headers,
-                json={"filter": {"textQuery": sport}}
-            )
+                json={"filter": {"textQuery": sport.name.lower()}},
+                timeout=aiohttp.ClientTimeout(total=BOOK_TIMEOUT['betfair'])
+            ) as response:
+                response.raise_for_status()
+                return await _read_json(response)
+        
+        # First get event IDs for each sport
+        events = await self._fetch_each_sport('betfair', list_events, sports)
+        market_sports = {
+            event['marketId']: sport
+            for sport, sport_events in events.items()
+            for event in sport_events
+        }
+        
+        # Then get odds for all sports' events together, in as few calls as Betfair allows
+        market_ids = list(market_sports)
+        market_books = await asyncio.gather(*(
+            self._get_market_book_betfair(session, headers, market_ids[i:i + BETFAIR_MARKET_BATCH])
+            for i in range(0, len(market_ids), BETFAIR_MARKET_BATCH)
+        ), return_exceptions=True)
+        
+        # A failed batch loses only its own markets; if every batch fails the bookmaker fails
+        errors = [market_book for market_book in market_books if isinstance(market_book, Exception)]
+        for error in errors:
+            self.record_error("Betfair market book", error)
+        if errors and len(errors) == len(market_books):
+            raise errors[0]
+        
+        odds = {sport: [] for sport in sports}
+        for market_book in market_books:
+            if isinstance(market_book, Exception):
+                continue
+            for market in market_book:
+                odds[market_sports[market['marketId']]].append(market)
+        return odds
+
+    async def _get_market_book_betfair(self, session: aiohttp.ClientSession, headers: Dict,
+                                       market_ids: List[str]) -> List[Dict]:
+        """Fetch the market book for the given Betfair market IDs"""
+        async with self._limits['betfair'], session.post(
+            'https://api.betfair.com/exchange/betting/rest/v1.0/listMarketBook/',
+            headers=headers,
+            json={"marketIds": market_ids},
+            timeout=aiohttp.ClientTimeout(total=BOOK_TIMEOUT['betfair'])
+        ) as response:
             response.raise_for_status()
-            events = response.json()
-            
-            all_odds = []
-            for event in events:
-                # Then get odds for each event
-                market_response = requests.post(
-                    'https://api.betfair.com/exchange/betting/rest/v1.0/listMarketBook/',
+            return await _read_events(response, 'item')
+
+    async def stream_odds_pinnacle(self):
+        """Follow Pinnacle's WebSocket odds feed, reconnecting on failure"""
+        headers = {'Authorization': f'Bearer {self.api_keys["pinnacle"]}'}
+        subscription = {
+            'type': 'subscribe',
+            'sportIds': PINNACLE_IDS,
+            'oddsFormat': 'DECIMAL'
+        }
+        backoff = 1
+        while True:
+            try:
+                session = await get_session()
+                async with session.ws_connect(
+                    'wss://api.pinnacle.com/v1/odds/stream',
                     headers=headers,
-                    json={"marketIds": [event['marketId']]}
-                )
-                if market_response.status_code == 200:
-                    all_odds.extend(market_response.json())
-            
-            return all_odds
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching Betfair odds: {e}")
-            return []
-
-    def _get_sport_id(self, sport: str) -> Dict:
-        """Convert sport name to ID for various bookmakers"""
-        sport_ids = {
-            'football': {
-                'pinnacle': 29,
-                'betfair': 1,
-                'draftkings': 'NFL',
-                'fanduel': 'american-football'
-            },
-            'tennis': {
-                'pinnacle': 33,
-                'betfair': 2,
-                'draftkings': 'TENNIS',
-                'fanduel': 'tennis'
+                    heartbeat=30,
+                    max_msg_size=STREAM_MESSAGE_LIMIT
+                ) as ws:
+                    await ws.send_str(_dumps(subscription))
+                    async for message in ws:
+                        if message.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        try:
+                            applied = self._apply_pinnacle_update(orjson.loads(message.data))
+                        except (orjson.JSONDecodeError, AttributeError) as e:
+                            self.record_error("Pinnacle stream message", e)
+                            continue
+                        # Only odds prove the subscription works; until then reconnects keep backing off
+                        if applied:
+                            backoff = 1
+            except Exception as e:  # Any failure reconnects; cancellation still ends the task
+                self.record_error("Pinnacle odds stream", e)
+            self._reset_stream('pinnacle')
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+
+    def _apply_pinnacle_update(self, update: Dict) -> bool:
+        """Queue the quotes in a Pinnacle odds delta; returns whether it was an odds message"""
+        self._stream_last_seen['pinnacle'] = time.monotonic()
+        sport = _sport_from_id(PINNACLE_IDS, update.get('sportId'))
+        if sport is None or 'eventId' not in update:
+            return False
+        # A malformed delta or market is skipped on its own; tearing down the socket would drop every streamed quote
+        event_name = update.get('event')
+        if not isinstance(event_name, str):
+            self.record_error("Pinnacle stream message", ValueError(f"no event name for event {update['eventId']}"))
+            return False
+        now = time.time()
+        for market in update.get('markets', []):
+            try:
+                quote = {
+                    'event': event_name,
+                    'name': market['name'],
+                    'odds': market['odds'],
+                    'ts': now
+                }
+            except (KeyError, TypeError) as e:
+                self.record_error("Pinnacle stream message", e)
+                continue
+            self.updates.put_nowait(('pinnacle', sport, quote))
+        return True
+
+    async def stream_odds_betfair(self):
+        """Follow Betfair's Exchange Stream API, reconnecting on failure"""
+        subscription = {
+            'op': 'marketSubscription',
+            'id': 2,
+            'marketFilter': {
+                'eventTypeIds': [str(sport_id) for sport_id in BETFAIR_IDS]
             },
-            'basketball': {
-                'pinnacle': 4,
-                'betfair': 7522,
-                'draftkings': 'NBA',
-                'fanduel': 'basketball'
-            }
+            'marketDataFilter': {'fields': ['EX_BEST_OFFERS', 'EX_MARKET_DEF'], 'ladderLevels': 1}
         }
-        return sport_ids.get(sport.lower(), {})
+        backoff = 1
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.open_connection(
+                    'stream-api.betfair.com', 443, ssl=True, limit=STREAM_MESSAGE_LIMIT
+                )
+                for request in ({
+                    'op': 'authentication',
+                    'id': 1,
+                    'appKey': self.api_keys['betfair'],
+                    'session': os.getenv('BETFAIR_SESSION_TOKEN')
+                }, subscription):
+                    writer.write(orjson.dumps(request) + b'\r\n')
+                await writer.drain()
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    try:
+                        applied = self._apply_betfair_update(orjson.loads(line))
+                    except (orjson.JSONDecodeError, AttributeError) as e:
+                        self.record_error("Betfair stream message", e)
+                        continue
+                    # Only market data proves authentication and subscription worked
+                    if applied:
+                        backoff = 1
+            except Exception as e:  # Any failure reconnects; cancellation still ends the task
+                self.record_error("Betfair odds stream", e)
+            finally:
+                if writer is not None:
+                    writer.close()
+            self._reset_stream('betfair')
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60)
 
-    def get_odds_draftkings(self, sport: str) -> List[Dict]:
-        """Fetch odds from DraftKings API"""
-        try:
-            headers = {
-                'Authorization': f'Bearer {self.api_keys["draftkings"]}',
-                'Accept': 'application/json'
-            }
-            sport_id = self._get_sport_id(sport).get('draftkings')
-            response = requests.get(
-                f'https://api.draftkings.com/sites/US-SB/sports/{sport_id}/odds',
-                headers=headers
+    def _apply_betfair_update(self, message: Dict) -> bool:
+        """Queue the quotes in a Betfair market change message; returns whether it was market data"""
+        if message.get('op') == 'status' and message.get('statusCode') == 'FAILURE':
+            raise ValueError(message.get('errorMessage'))
+        self._stream_last_seen['betfair'] = time.monotonic()
+        if message.get('op') != 'mcm':
+            return False
+        now = time.time()
+        for market_change in message.get('mc', []):
+            # A malformed market change is skipped on its own; tearing down the stream would drop every streamed quote
+            try:
+                self._apply_betfair_market_change(market_change, now)
+            except (KeyError, IndexError, TypeError, AttributeError) as e:
+                self.record_error("Betfair stream message", e)
+        return True
+
+    def _apply_betfair_market_change(self, market_change: Dict, now: float):
+        """Queue the best back prices in one market's change"""
+        definition = market_change.get('marketDefinition')
+        if definition:
+            # Definitions arrive before prices; remember where each market lives
+            sport = _sport_from_id(BETFAIR_IDS, definition.get('eventTypeId'))
+            if sport is None:
+                return
+            self._betfair_markets[market_change['id']] = (
+                sport, definition['eventId'], definition.get('eventName', definition['eventId'])
             )
+        location = self._betfair_markets.get(market_change['id'])
+        if location is None:
+            return
+        sport, _, event_name = location
+        runners = self._betfair_runners.get(market_change['id'])
+        for runner_change in market_change.get('rc', []):
+            best_back = runner_change.get('batb')
+            if not best_back:
+                continue
+            # batb entries are [level, price, size]; level 0 is the best price
+            selection, odds = runner_change['id'], best_back[0][1]
+            if runners is None:
+                # Hold the price until the catalogue names the runner
+                self._betfair_unnamed_prices[(market_change['id'], selection)] = (odds, now)
+                self._betfair_unnamed.add(market_change['id'])
+                self._betfair_naming.set()
+                continue
+            if selection in runners:
+                self._queue_betfair_quote(sport, event_name, runners[selection], odds, now)
+
+    def _queue_betfair_quote(self, sport: Sport, event_name: str, runner_name: str, odds: float, ts: float):
+        """Queue one streamed Betfair price under its runner name"""
+        self.updates.put_nowait(('betfair', sport, {'event': event_name, 'name': runner_name, 'odds': odds, 'ts': ts}))
+
+    async def name_betfair_runners(self):
+        """Look up runner names for newly streamed Betfair markets, then release the prices held for them"""
+        delay = 1
+        while True:
+            await self._betfair_naming.wait()
+            self._betfair_naming.clear()
+            while self._betfair_unnamed:
+                market_ids = list(self._betfair_unnamed)[:BETFAIR_MARKET_BATCH]
+                try:
+                    catalogue = await self._get_market_catalogue_betfair(market_ids)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                    self.record_error("Betfair market catalogue", e)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 60)
+                    continue
+                delay = 1
+                self._betfair_unnamed.difference_update(market_ids)
+                # Markets missing from the catalogue (closed, or dropped by a reset) get no names and stay unquoted
+                for market in catalogue:
+                    try:
+                        runners = {runner['selectionId']: runner['runnerName'] for runner in market['runners']}
+                        self._betfair_runners[market['marketId']] = runners
+                    except (KeyError, TypeError) as e:
+                        self.record_error("Betfair market catalogue", e)
+                for key in [key for key in self._betfair_unnamed_prices if key[0] in market_ids]:
+                    odds, ts = self._betfair_unnamed_prices.pop(key)
+                    market_id, selection = key
+                    runners, location = self._betfair_runners.get(market_id, {}), self._betfair_markets.get(market_id)
+                    if selection in runners and location is not None:
+                        self._queue_betfair_quote(location[0], location[2], runners[selection], odds, ts)
+
+    async def _get_market_catalogue_betfair(self, market_ids: List[str]) -> List[Dict]:
+        """Fetch the runner descriptions for the given Betfair market IDs"""
+        session = await get_session()
+        async with self._limits['betfair'], session.post(
+            'https://api.betfair.com/exchange/betting/rest/v1.0/listMarketCatalogue/',
+            headers=self._bet_headers('betfair'),
+            json={
+                "filter": {"marketIds": market_ids},
+                "marketProjection": ["RUNNER_DESCRIPTION"],
+                "maxResults": len(market_ids)
+            },
+            timeout=aiohttp.ClientTimeout(total=BOOK_TIMEOUT['betfair'])
+        ) as response:
             response.raise_for_status()
-            return response.json().get('events', [])
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching DraftKings odds: {e}")
-            return []
+            return await _read_json(response)
 
-    def get_odds_fanduel(self, sport: str) -> List[Dict]:
-        """Fetch odds from FanDuel API"""
-        try:
-            headers = {
-                'Authorization': f'Bearer {self.api_keys["fanduel"]}',
-                'Accept': 'application/json'
-            }
-            sport_id = self._get_sport_id(sport).get('fanduel')
-            response = requests.get(
-                f'https://sportsbook.fanduel.com/api/content-service/v2/sports/{sport_id}/events',
-                headers=headers
+    def _reset_stream(self, book: str):
+        """Drop streamed odds after a disconnect so REST takes over until resubscribed"""
+        self._stream_last_seen.pop(book, None)
+        for key in [key for key, quotes in self.market_index.items() if book in quotes]:
+            self._remove_quote(book, key)
+        if book == 'betfair':
+            self._betfair_markets.clear()
+            self._betfair_runners.clear()
+            self._betfair_unnamed.clear()
+            self._betfair_unnamed_prices.clear()
+
+    async def watch_updates(self):
+        """Yield opportunities as streamed odds change, rechecking only the market that moved"""
+        while True:
+            book, sport, quote = await self.updates.get()
+            try:
+                odds = _checked_odds(quote['odds'])
+                event_key, market_key = _event_key(sport, quote), _market_key(quote)
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                # A malformed message is dropped so the rest of the stream keeps flowing
+                self.record_error(f"{BOOKMAKERS[book]} streamed quote", e)
+                continue
+            event_id = self._intern(event_key)
+            key = self._intern((event_id, market_key))
+            self._record_history(book, [event_id], [key], [odds])
+            if self._update_quote(book, key, quote, time.monotonic_ns(), streamed=True) or key in self._stale:
+                for opportunity in self._recheck([key]):
+                    yield opportunity
+
+    def _intern(self, value: Tuple) -> int:
+        """Stable integer ID for an event or market key"""
+        symbol = self._symbols.get(value)
+        if symbol is None:
+            symbol = self._symbols[value] = self._next_symbol
+            self._symbol_names[symbol] = value
+            self._next_symbol += 1
+        return symbol
+
+    def symbol_name(self, symbol: int) -> Optional[Tuple]:
+        """
+        Key behind an event or market ID, e.g. from latest_snapshot(): (sport, home, away) for events,
+        (event ID, market key) for markets; None for an unknown or pruned ID
+        """
+        return self._symbol_names.get(symbol)
+
+    def _prune_symbols(self):
+        """Forget IDs that no market row, poll record or history row still refers to"""
+        in_use = set(self._market_rows)
+        for keys in self._polled_keys.values():
+            in_use.update(keys)
+        in_use.update(self._symbol_names[key][0] for key in list(in_use))
+        in_use.update(self._history.symbols())
+        for value, symbol in list(self._symbols.items()):
+            if symbol not in in_use:
+                del self._symbols[value]
+                del self._symbol_names[symbol]
+
+    async def prune_symbols(self):
+        """Drop unused event and market IDs once per SYMBOL_PRUNE_INTERVAL"""
+        while True:
+            await asyncio.sleep(SYMBOL_PRUNE_INTERVAL)
+            self._prune_symbols()
+
+    def _market_row(self, key: int) -> int:
+        """Row of a market in the odds matrix, growing the matrix when it is full"""
+        row = self._market_rows.get(key)
+        if row is None:
+            if not self._free_rows:
+                size = self._odds.shape[0]
+                self._odds = np.concatenate([self._odds, np.zeros_like(self._odds)])
+                self._quote_ns = np.concatenate([self._quote_ns, np.zeros_like(self._quote_ns)])
+                self._streamed = np.concatenate([self._streamed, np.zeros_like(self._streamed)])
+                self._free_rows = list(range(2 * size - 1, size - 1, -1))
+            row = self._market_rows[key] = self._free_rows.pop()
+        return row
+
+    def _update_quote(self, book: str, key: int, quote: Dict, received_ns: int, streamed: bool = False) -> bool:
+        """Store a bookmaker's latest quote for a market; returns whether its price changed"""
+        self.market_index.setdefault(key, {})[book] = quote
+        row, column = self._market_row(key), BOOK_COLUMNS[book]
+        self._quote_ns[row, column] = received_ns
+        self._streamed[row, column] = streamed
+        odds = float(quote['odds'])
+        if self._odds[row, column] == odds:
+            return False
+        self._odds[row, column] = odds
+        return True
+
+    def _remove_quote(self, book: str, key: int):
+        """Forget a bookmaker's quote for a market"""
+        quotes = self.market_index.get(key)
+        if quotes is None or book not in quotes:
+            return
+        del quotes[book]
+        row = self._market_rows[key]
+        self._odds[row, BOOK_COLUMNS[book]] = 0.0
+        self._streamed[row, BOOK_COLUMNS[book]] = False
+        if not quotes:
+            del self.market_index[key]
+            del self._market_rows[key]
+            self._free_rows.append(row)
+            self._emitted.pop(key, None)
+            self._stale.discard(key)
+
+    def _ingest(self, book: str, sport: Sport, events: List[Dict], received_ns: int) -> Set[int]:
+        """Apply a bookmaker's polled odds to the market index; returns the markets whose prices changed"""
+        changed = set()
+        keys = set()
+        polled_events = []
+        polled = []
+        polled_odds = []
+        for event in events:
+            # Malformed events and markets are skipped alone, so one bad entry cannot stall the whole tick
+            try:
+                event_key = _event_key(sport, event)
+                event_name = event.get('event') or f"{event['home']} vs {event['away']}"
+            except (KeyError, TypeError, AttributeError) as e:
+                self.record_error(f"{BOOKMAKERS[book]} polled event", e)
+                continue
+            event_id = self._intern(event_key)
+            for market in event.get('markets', []):
+                try:
+                    odds = _checked_odds(market['odds'])
+                    market_key = _market_key(market)
+                    quote = {'event': event_name, 'name': market['name'], 'odds': odds}
+                except (KeyError, TypeError, ValueError, AttributeError) as e:
+                    self.record_error(f"{BOOKMAKERS[book]} polled market", e)
+                    continue
+                key = self._intern((event_id, market_key))
+                keys.add(key)
+                polled_events.append(event_id)
+                polled.append(key)
+                polled_odds.append(odds)
+                # A confirmed price is fresh again, so recheck it against any streamed quotes, and any
+                # pair that was only held back for staleness
+                if (self._update_quote(book, key, quote, received_ns) or key in self._stale
+                        or self._streamed[self._market_rows[key]].any()):
+                    changed.add(key)
+        self._record_history(book, polled_events, polled, polled_odds)
+        for key in self._polled_keys.get((book, sport), set()) - keys:
+            self._remove_quote(book, key)
+            changed.add(key)
+        self._polled_keys[(book, sport)] = keys
+        return changed
+
+    def _record_history(self, book: str, event_ids: List[int], market_ids: List[int], odds: List[float]):
+        """Append quotes to the odds history"""
+        self._history.append(time.time_ns(), event_ids, market_ids, BOOK_COLUMNS[book], odds)
+
+    def latest_snapshot(self) -> 'pa.Table':
+        """
+        Recent quotes as an Arrow table (ts, event_id, market_id, bookmaker_id, odds), oldest first
+        bookmaker_id is the bookmaker's position in BOOKMAKERS; requires pyarrow
+        """
+        if pa is None:
+            raise RuntimeError("pyarrow is required for latest_snapshot()")
+        return self._history.table()
+
+    def _recheck(self, keys: Iterable[int]) -> List[Opportunity]:
+        """Check the given markets for arbitrage between the two best prices quoted on each"""
+        opportunities = []
+        keys = [key for key in keys if key in self._market_rows]
+        if not keys:
+            return opportunities
+        
+        # Pick the two best prices per market by implied probability; a missing quote is never best
+        rows = [self._market_rows[key] for key in keys]
+        odds = self._odds[rows]
+        implied = np.divide(1.0, odds, out=np.full_like(odds, np.inf), where=odds > 0)
+        best = np.argsort(implied, axis=1, kind='stable')[:, :2]
+        best_inv = np.take_along_axis(implied, best, axis=1)
+        quoted = np.flatnonzero(np.isfinite(best_inv[:, 1]))
+        
+        # Streamed quotes count as current while their stream is live; every other quote is as old as
+        # its last read. Both legs must be recent and read within STALENESS_NS of each other, so a
+        # polled price is only paired with a streamed one shortly after it was polled
+        now = time.monotonic_ns()
+        stream_live = np.array([self._stream_is_live(book) for book in BOOK_NAMES])
+        live = (np.take_along_axis(self._streamed[rows], best, axis=1) & stream_live[best])[quoted]
+        received = np.where(live, now, np.take_along_axis(self._quote_ns[rows], best, axis=1)[quoted])
+        recent = now - received <= QUOTE_MAX_AGE_NS
+        consistent = np.abs(received[:, 0] - received[:, 1]) <= STALENESS_NS
+        usable = recent.all(axis=1) & consistent
+        
+        # Detection and stake sizing in one closed-form pass; only hits become Python objects
+        hits, profits, stakes, potential_profits = _screen_arbitrage(
+            best_inv[quoted], self.min_profit_threshold, self.max_stake
+        )
+        markets, fresh = quoted[hits], usable[hits]
+        # Remember held-back pairs that would pay, so a fresh confirmation of either leg retries them
+        self._stale.difference_update(keys[market] for market in quoted[usable].tolist())
+        self._stale.update(keys[market] for market in markets[~fresh].tolist())
+        if not fresh.any():
+            return opportunities
+        timestamp = datetime.now(timezone.utc)
+        
+        for market, profit, (stake1, stake2), potential_profit in zip(
+            markets[fresh].tolist(), profits[fresh].tolist(), stakes[fresh].tolist(), potential_profits[fresh].tolist()
+        ):
+            key = keys[market]
+            column1, column2 = best[market]
+            book1, book2 = BOOK_NAMES[column1], BOOK_NAMES[column2]
+            leg1 = Leg(book=book1, odds=float(odds[market, column1]), stake=stake1)
+            leg2 = Leg(book=book2, odds=float(odds[market, column2]), stake=stake2)
+            # Only report an arbitrage again once its books or prices change
+            signature = (leg1, leg2)
+            if self._emitted.get(key) == signature:
+                continue
+            self._emitted[key] = signature
+            quote = self.market_index[key][book1]
+            opportunities.append(Opportunity(
+                event=quote['event'],
+                market=quote['name'],
+                leg1=leg1,
+                leg2=leg2,
+                profit_percentage=profit,
+                potential_profit=potential_profit,
+                timestamp=timestamp
+            ))
+        return opportunities
+
+    def _stream_is_live(self, book: str) -> bool:
+        """Whether the streaming feed for a bookmaker is connected and fresh"""
+        last_seen = self._stream_last_seen.get(book)
+        return last_seen is not None and time.monotonic() - last_seen < STREAM_STALE_AFTER
+
+    @ttl_cached
+    async def get_odds_draftkings(self, session: aiohttp.ClientSession, sports: List[Sport]) -> Dict[Sport, List[Dict]]:
+        """Fetch odds from DraftKings API, one request per sport"""
+        headers = {
+            'Authorization': f'Bearer {self.api_keys["draftkings"]}',
+            'Accept': 'application/json'
+        }
+        
+        async def fetch(sport: Sport) -> List[Dict]:
+            return await self._get_events(
+                'draftkings', session, f'https://api.draftkings.com/sites/US-SB/sports/{DRAFTKINGS_IDS[sport]}/odds',
+                'events.item', headers=headers
             )
-            response.raise_for_status()
-            return response.json().get('events', [])
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching FanDuel odds: {e}")
-            return []
+        
+        return await self._fetch_each_sport('draftkings', fetch, sports)
 
-    def get_odds_williamhill(self, sport: str) -> List[Dict]:
-        """Fetch odds from William Hill API"""
-        try:
-            headers = {'Authorization': f'Bearer {self.api_keys["williamhill"]}'}
-            response = requests.get(
-                'https://api.williamhill.com/v1/odds',
-                params={'sport': sport},
+    @ttl_cached
+    async def get_odds_fanduel(self, session: aiohttp.ClientSession, sports: List[Sport]) -> Dict[Sport, List[Dict]]:
+        """Fetch odds from FanDuel API, one request per sport"""
+        headers = {
+            'Authorization': f'Bearer {self.api_keys["fanduel"]}',
+            'Accept': 'application/json'
+        }
+        
+        async def fetch(sport: Sport) -> List[Dict]:
+            return await self._get_events(
+                'fanduel', session, f'https://sportsbook.fanduel.com/api/content-service/v2/sports/{FANDUEL_IDS[sport]}/events',
+                'events.item', headers=headers
+            )
+        
+        return await self._fetch_each_sport('fanduel', fetch, sports)
+
+    @ttl_cached
+    async def get_odds_williamhill(self, session: aiohttp.ClientSession, sports: List[Sport]) -> Dict[Sport, List[Dict]]:
+        """Fetch odds from William Hill API, one request per sport"""
+        headers = {'Authorization': f'Bearer {self.api_keys["williamhill"]}'}
+        
+        # The bulk multi-sport response does not reliably tag events with their sport,
+        # so ask per sport rather than guess and drop the untagged ones
+        async def fetch(sport: Sport) -> List[Dict]:
+            return await self._get_events(
+                'williamhill', session, 'https://api.williamhill.com/v1/odds', 'item',
+                params={'sport': sport.name.lower()},
                 headers=headers
             )
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error fetching William Hill odds: {e}")
-            return []
+        
+        return await self._fetch_each_sport('williamhill', fetch, sports)
+
+    def _bet_headers(self, book: str) -> Dict:
+        """Authentication headers for a bookmaker's betting API"""
+        if book == 'betfair':
+            return {
+                'X-Application': self.api_keys["betfair"],
+                'X-Authentication': os.getenv('BETFAIR_SESSION_TOKEN'),
+                'Accept': 'application/json'
+            }
+        headers = {'Authorization': f'Bearer {self.api_keys[book]}'}
+        if book in ('draftkings', 'fanduel'):
+            headers['Accept'] = 'application/json'
+        return headers
 
-    def calculate_arbitrage(self, odds1: float, odds2: float) -> Tuple[bool, float, Dict[str, float]]:
+    async def _post_bet(self, book: str, url: str, bet_details: Dict):
         """
-        Calculate if there's an arbitrage opportunity between two odds
-        Returns: (is_arbitrage, profit_percentage, stake_distribution)
+        POST a bet request, retrying connection failures
+        The idempotency key lets the bookmaker drop duplicates, so retries never double-stake
         """
-        inv_sum = (1 / odds1) + (1 / odds2)
-        profit_percentage = (1 - inv_sum) * 100
-
-        if profit_percentage > self.min_profit_threshold:
-            # Calculate optimal stake distribution
-            total_stake = min(self.max_stake, 1000)  # Limit maximum stake
-            stake1 = total_stake * (1 / odds1) / inv_sum
-            stake2 = total_stake * (1 / odds2) / inv_sum
-            
-            return True, profit_percentage, {
-                'total_stake': total_stake,
-                'stake1': stake1,
-                'stake2': stake2,
-                'potential_profit': total_stake * (profit_percentage / 100)
-            }
-        
-        return False, profit_percentage, {}
+        session = await get_bet_session()
+        headers = self._bet_headers(book)
+        headers['Idempotency-Key'] = bet_details['idempotency_key']
+        for attempt in range(BET_RETRIES + 1):
+            try:
+                async with session.post(url, json=bet_details, headers=headers) as response:
+                    response.raise_for_status()
+                    return
+            except aiohttp.ClientConnectionError:
+                if attempt == BET_RETRIES:
+                    raise
+                await asyncio.sleep(0.1 * 2 ** attempt)
 
-    def place_bet_pinnacle(self, bet_details: Dict) -> bool:
+    async def place_bet_pinnacle(self, bet_details: Dict) -> bool:
         """Place a bet on Pinnacle"""
         try:
-            headers = {'Authorization': f'Bearer {self.api_keys["pinnacle"]}'}
-            response = requests.post(
-                'https://api.pinnacle.com/v1/bets/place',
-                json=bet_details,
-                headers=headers
-            )
-            response.raise_for_status()
-            logging.info(f"Bet placed successfully on Pinnacle: {bet_details}")
+            await self._post_bet('pinnacle', 'https://api.pinnacle.com/v1/bets/place', bet_details)
+            logging.info("Bet placed successfully on Pinnacle: %s", bet_details)
             return True
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error placing bet on Pinnacle: {e}")
+        except aiohttp.ClientError as e:
+            logging.error("Error placing bet on Pinnacle: %s", e)
             return False
 
-    def place_bet_betfair(self, bet_details: Dict) -> bool:
+    async def place_bet_betfair(self, bet_details: Dict) -> bool:
         """Place a bet on Betfair"""
         try:
-            headers = {
-                'X-Application': self.api_keys["betfair"],
-                'X-Authentication': os.getenv('BETFAIR_SESSION_TOKEN'),
-                'Accept': 'application/json'
-            }
-            response = requests.post(
-                'https://api.betfair.com/exchange/betting/rest/v1.0/placeOrders',
-                json=bet_details,
-                headers=headers
-            )
-            response.raise_for_status()
-            logging.info(f"Bet placed successfully on Betfair: {bet_details}")
+            await self._post_bet('betfair', 'https://api.betfair.com/exchange/betting/rest/v1.0/placeOrders', bet_details)
+            logging.info("Bet placed successfully on Betfair: %s", bet_details)
+            return True
+        except aiohttp.ClientError as e:
+            logging.error("Error placing bet on Betfair: %s", e)
+            return False
+
+    async def place_bets_betfair(self, bets: List[Dict]) -> List:
+        """
+        Place several bets on Betfair, one placeOrders request per market since each request
+        names a single market; a market's bets succeed or fail together, independently of other markets
+        Returns: per bet, True, False, or the exception that left its outcome unknown
+        """
+        by_market: Dict[str, List[int]] = defaultdict(list)
+        for index, bet in enumerate(bets):
+            by_market[bet['market']].append(index)
+        markets = list(by_market)
+        outcomes = await asyncio.gather(*(
+            self._place_market_bets_betfair(market, [bets[index] for index in by_market[market]])
+            for market in markets
+        ), return_exceptions=True)
+        results = [False] * len(bets)
+        for market, outcome in zip(markets, outcomes):
+            for index in by_market[market]:
+                results[index] = outcome
+        return results
+
+    async def _place_market_bets_betfair(self, market: str, bets: List[Dict]) -> bool:
+        """Place one market's bets on Betfair in a single placeOrders request"""
+        try:
+            await self._post_bet('betfair', 'https://api.betfair.com/exchange/betting/rest/v1.0/placeOrders', {
+                'marketId': market,
+                'instructions': bets,
+                'idempotency_key': str(uuid.uuid4())
+            })
+            logging.info("%s bets placed successfully on Betfair market %s", len(bets), market)
             return True
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error placing bet on Betfair: {e}")
+        except aiohttp.ClientError as e:
+            logging.error("Error placing %s bets on Betfair market %s: %s", len(bets), market, e)
             return False
 
-    def place_bet_draftkings(self, bet_details: Dict) -> bool:
+    async def place_bet_draftkings(self, bet_details: Dict) -> bool:
         """Place a bet on DraftKings"""
         try:
-            headers = {
-                'Authorization': f'Bearer {self.api_keys["draftkings"]}',
-                'Accept': 'application/json'
-            }
-            response = requests.post(
-                'https://api.draftkings.com/v1/bets/place',
-                json=bet_details,
-                headers=headers
-            )
-            response.raise_for_status()
-            logging.info(f"Bet placed successfully on DraftKings: {bet_details}")
+            await self._post_bet('draftkings', 'https://api.draftkings.com/v1/bets/place', bet_details)
+            logging.info("Bet placed successfully on DraftKings: %s", bet_details)
             return True
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error placing bet on DraftKings: {e}")
+        except aiohttp.ClientError as e:
+            logging.error("Error placing bet on DraftKings: %s", e)
             return False
 
-    def place_bet_fanduel(self, bet_details: Dict) -> bool:
+    async def place_bet_fanduel(self, bet_details: Dict) -> bool:
         """Place a bet on FanDuel"""
         try:
-            headers = {
-                'Authorization': f'Bearer {self.api_keys["fanduel"]}',
-                'Accept': 'application/json'
-            }
-            response = requests.post(
-                'https://api.fanduel.com/v1/bets/place',
-                json=bet_details,
-                headers=headers
-            )
-            response.raise_for_status()
-            logging.info(f"Bet placed successfully on FanDuel: {bet_details}")
+            await self._post_bet('fanduel', 'https://api.fanduel.com/v1/bets/place', bet_details)
+            logging.info("Bet placed successfully on FanDuel: %s", bet_details)
             return True
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error placing bet on FanDuel: {e}")
+        except aiohttp.ClientError as e:
+            logging.error("Error placing bet on FanDuel: %s", e)
             return False
 
-    def place_bet_williamhill(self, bet_details: Dict) -> bool:
+    async def place_bet_williamhill(self, bet_details: Dict) -> bool:
         """Place a bet on William Hill"""
         try:
-            headers = {'Authorization': f'Bearer {self.api_keys["williamhill"]}'}
-            response = requests.post(
-                'https://api.williamhill.com/v1/bets/place',
-                json=bet_details,
-                headers=headers
-            )
-            response.raise_for_status()
-            logging.info(f"Bet placed successfully on William Hill: {bet_details}")
+            await self._post_bet('williamhill', 'https://api.williamhill.com/v1/bets/place', bet_details)
+            logging.info("Bet placed successfully on William Hill: %s", bet_details)
             return True
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Error placing bet on William Hill: {e}")
+        except aiohttp.ClientError as e:
+            logging.error("Error placing bet on William Hill: %s", e)
             return False
 
-    def find_opportunities(self, sport: str) -> List[Dict]:
-        """Find arbitrage opportunities for a given sport"""
-        opportunities = []
-        
-        # Fetch odds from different bookmakers
-        pinnacle_odds = self.get_odds_pinnacle(sport)
-        betfair_odds = self.get_odds_betfair(sport)
-        draftkings_odds = self.get_odds_draftkings(sport)
-        fanduel_odds = self.get_odds_fanduel(sport)
-        williamhill_odds = self.get_odds_williamhill(sport)
-        
-        # Compare odds for each matching event
-        for p_event in pinnacle_odds:
-            for b_event in betfair_odds:
-                if self._is_same_event(p_event, b_event):
-                    # Check each market combination
-                    for p_market in p_event['markets']:
-                        for b_market in b_event['markets']:
-                            if self._is_matching_market(p_market, b_market):
-                                is_arb, profit, stakes = self.calculate_arbitrage(
-                                    float(p_market['odds']),
-                                    float(b_market['odds'])
-                                )
-                                
-                                if is_arb:
-                                    opportunities.append({
-                                        'event': p_event['event'],
-                                        'market': p_market['name'],
-                                        'bookmaker1': {
-                                            'name': 'Pinnacle',
-                                            'odds': p_market['odds'],
-                                            'stake': stakes['stake1']
-                                        },
-                                        'bookmaker2': {
-                                            'name': 'Betfair',
-                                            'odds': b_market['odds'],
-                                            'stake': stakes['stake2']
-                                        },
-                                        'profit_percentage': profit,
-                                        'potential_profit': stakes['potential_profit'],
-                                        'timestamp': datetime.now().isoformat()
-                                    })
-        
-        for p_event in pinnacle_odds:
-            for d_event in draftkings_odds:
-                if self._is_same_event(p_event, d_event):
-                    # Check each market combination
-                    for p_market in p_event['markets']:
-                        for d_market in d_event['markets']:
-                            if self._is_matching_market(p_market, d_market):
-                                is_arb, profit, stakes = self.calculate_arbitrage(
-                                    float(p_market['odds']),
-                                    float(d_market['odds'])
-                                )
-                                
-                                if is_arb:
-                                    opportunities.append({
-                                        'event': p_event['event'],
-                                        'market': p_market['name'],
-                                        'bookmaker1': {
-                                            'name': 'Pinnacle',
-                                            'odds': p_market['odds'],
-                                            'stake': stakes['stake1']
-                                        },
-                                        'bookmaker2': {
-                                            'name': 'DraftKings',
-                                            'odds': d_market['odds'],
-                                            'stake': stakes['stake2']
-                                        },
-                                        'profit_percentage': profit,
-                                        'potential_profit': stakes['potential_profit'],
-                                        'timestamp': datetime.now().isoformat()
-                                    })
-        
-        for p_event in pinnacle_odds:
-            for f_event in fanduel_odds:
-                if self._is_same_event(p_event, f_event):
-                    # Check each market combination
-                    for p_market in p_event['markets']:
-                        for f_market in f_event['markets']:
-                            if self._is_matching_market(p_market, f_market):
-                                is_arb, profit, stakes = self.calculate_arbitrage(
-                                    float(p_market['odds']),
-                                    float(f_market['odds'])
-                                )
-                                
-                                if is_arb:
-                                    opportunities.append({
-                                        'event': p_event['event'],
-                                        'market': p_market['name'],
-                                        'bookmaker1': {
-                                            'name': 'Pinnacle',
-                                            'odds': p_market['odds'],
-                                            'stake': stakes['stake1']
-                                        },
-                                        'bookmaker2': {
-                                            'name': 'FanDuel',
-                                            'odds': f_market['odds'],
-                                            'stake': stakes['stake2']
-                                        },
-                                        'profit_percentage': profit,
-                                        'potential_profit': stakes['potential_profit'],
-                                        'timestamp': datetime.now().isoformat()
-                                    })
-        
-        for p_event in pinnacle_odds:
-            for w_event in williamhill_odds:
-                if self._is_same_event(p_event, w_event):
-                    # Check each market combination
-                    for p_market in p_event['markets']:
-                        for w_market in w_event['markets']:
-                            if self._is_matching_market(p_market, w_market):
-                                is_arb, profit, stakes = self.calculate_arbitrage(
-                                    float(p_market['odds']),
-                                    float(w_market['odds'])
-                                )
-                                
-                                if is_arb:
-                                    opportunities.append({
-                                        'event': p_event['event'],
-                                        'market': p_market['name'],
-                                        'bookmaker1': {
-                                            'name': 'Pinnacle',
-                                            'odds': p_market['odds'],
-                                            'stake': stakes['stake1']
-                                        },
-                                        'bookmaker2': {
-                                            'name': 'William Hill',
-                                            'odds': w_market['odds'],
-                                            'stake': stakes['stake2']
-                                        },
-                                        'profit_percentage': profit,
-                                        'potential_profit': stakes['potential_profit'],
-                                        'timestamp': datetime.now().isoformat()
-                                    })
-        
-        for b_event in betfair_odds:
-            for d_event in draftkings_odds:
-                if self._is_same_event(b_event, d_event):
-                    # Check each market combination
-                    for b_market in b_event['markets']:
-                        for d_market in d_event['markets']:
-                            if self._is_matching_market(b_market, d_market):
-                                is_arb, profit, stakes = self.calculate_arbitrage(
-                                    float(b_market['odds']),
-                                    float(d_market['odds'])
-                                )
-                                
-                                if is_arb:
-                                    opportunities.append({
-                                        'event': b_event['event'],
-                                        'market': b_market['name'],
-                                        'bookmaker1': {
-                                            'name': 'Betfair',
-                                            'odds': b_market['odds'],
-                                            'stake': stakes['stake1']
-                                        },
-                                        'bookmaker2': {
-                                            'name': 'DraftKings',
-                                            'odds': d_market['odds'],
-                                            'stake': stakes['stake2']
-                                        },
-                                        'profit_percentage': profit,
-                                        'potential_profit': stakes['potential_profit'],
-                                        'timestamp': datetime.now().isoformat()
-                                    })
-        
-        for b_event in betfair_odds:
-            for f_event in fanduel_odds:
-                if self._is_same_event(b_event, f_event):
-                    # Check each market combination
-                    for b_market in b_event['markets']:
-                        for f_market in f_event['markets']:
-                            if self._is_matching_market(b_market, f_market):
-                                is_arb, profit, stakes = self.calculate_arbitrage(
-                                    float(b_market['odds']),
-                                    float(f_market['odds'])
-                                )
-                                
-                                if is_arb:
-                                    opportunities.append({
-                                        'event': b_event['event'],
-                                        'market': b_market['name'],
-                                        'bookmaker1': {
-                                            'name': 'Betfair',
-                                            'odds': b_market['odds'],
-                                            'stake': stakes['stake1']
-                                        },
-                                        'bookmaker2': {
-                                            'name': 'FanDuel',
-                                            'odds': f_market['odds'],
-                                            'stake': stakes['stake2']
-                                        },
-                                        'profit_percentage': profit,
-                                        'potential_profit': stakes['potential_profit'],
-                                        'timestamp': datetime.now().isoformat()
-                                    })
+    async def cancel_bet_pinnacle(self, bet_details: Dict) -> bool:
+        """Cancel a bet on Pinnacle by its idempotency key"""
+        try:
+            await self._post_bet('pinnacle', 'https://api.pinnacle.com/v1/bets/cancel', _cancel_request(bet_details))
+            logging.info("Bet cancelled on Pinnacle: %s", bet_details)
+            return True
+        except aiohttp.ClientError as e:
+            logging.error("Error cancelling bet on Pinnacle: %s", e)
+            return False
+
+    async def cancel_bet_betfair(self, bet_details: Dict) -> bool:
+        """Cancel a bet on Betfair by its idempotency key"""
+        try:
+            await self._post_bet('betfair', 'https://api.betfair.com/exchange/betting/rest/v1.0/cancelOrders', _cancel_request(bet_details))
+            logging.info("Bet cancelled on Betfair: %s", bet_details)
+            return True
+        except aiohttp.ClientError as e:
+            logging.error("Error cancelling bet on Betfair: %s", e)
+            return False
+
+    async def cancel_bet_draftkings(self, bet_details: Dict) -> bool:
+        """Cancel a bet on DraftKings by its idempotency key"""
+        try:
+            await self._post_bet('draftkings', 'https://api.draftkings.com/v1/bets/cancel', _cancel_request(bet_details))
+            logging.info("Bet cancelled on DraftKings: %s", bet_details)
+            return True
+        except aiohttp.ClientError as e:
+            logging.error("Error cancelling bet on DraftKings: %s", e)
+            return False
+
+    async def cancel_bet_fanduel(self, bet_details: Dict) -> bool:
+        """Cancel a bet on FanDuel by its idempotency key"""
+        try:
+            await self._post_bet('fanduel', 'https://api.fanduel.com/v1/bets/cancel', _cancel_request(bet_details))
+            logging.info("Bet cancelled on FanDuel: %s", bet_details)
+            return True
+        except aiohttp.ClientError as e:
+            logging.error("Error cancelling bet on FanDuel: %s", e)
+            return False
+
+    async def cancel_bet_williamhill(self, bet_details: Dict) -> bool:
+        """Cancel a bet on William Hill by its idempotency key"""
+        try:
+            await self._post_bet('williamhill', 'https://api.williamhill.com/v1/bets/cancel', _cancel_request(bet_details))
+            logging.info("Bet cancelled on William Hill: %s", bet_details)
+            return True
+        except aiohttp.ClientError as e:
+            logging.error("Error cancelling bet on William Hill: %s", e)
+            return False
+
+    async def find_opportunities_all(self, sports: List[str]) -> Dict[str, List[Opportunity]]:
+        """
+        Poll the bookmakers without a live stream for all sports at once
+        and check the markets whose odds changed
+        Returns: opportunities keyed by sport
+        """
+        sport_keys = [Sport[sport.upper()] for sport in sports]
+        polled = [
+            book for book in BOOKMAKERS
+            if not self._stream_is_live(book) and self._breakers[book].allow()
+        ]
         
-        for b_event in betfair_odds:
-            for w_event in williamhill_odds:
-                if self._is_same_event(b_event, w_event):
-                    # Check each market combination
-                    for b_market in b_event['markets']:
-                        for w_market in w_event['markets']:
-                            if self._is_matching_market(b_market, w_market):
-                                is_arb, profit, stakes = self.calculate_arbitrage(
-                                    float(b_market['odds']),
-                                    float(w_market['odds'])
-                                )
-                                
-                                if is_arb:
-                                    opportunities.append({
-                                        'event': b_event['event'],
-                                        'market': b_market['name'],
-                                        'bookmaker1': {
-                                            'name': 'Betfair',
-                                            'odds': b_market['odds'],
-                                            'stake': stakes['stake1']
-                                        },
-                                        'bookmaker2': {
-                                            'name': 'William Hill',
-                                            'odds': w_market['odds'],
-                                            'stake': stakes['stake2']
-                                        },
-                                        'profit_percentage': profit,
-                                        'potential_profit': stakes['potential_profit'],
-                                        'timestamp': datetime.now().isoformat()
-                                    })
+        # Fetch odds from the polled bookmakers concurrently, one bulk call per bookmaker; a book that
+        # overruns its budget fails this tick like any other error
+        session = await get_session()
+        results = await asyncio.gather(
+            *(asyncio.wait_for(self._fetchers[book](session, sport_keys), BOOK_TIMEOUT[book]) for book in polled),
+            return_exceptions=True
+        )
         
-        for d_event in draftkings_odds:
-            for f_event in fanduel_odds:
-                if self._is_same_event(d_event, f_event):
-                    # Check each market combination
-                    for d_market in d_event['markets']:
-                        for f_market in f_event['markets']:
-                            if self._is_matching_market(d_market, f_market):
-                                is_arb, profit, stakes = self.calculate_arbitrage(
-                                    float(d_market['odds']),
-                                    float(f_market['odds'])
-                                )
-                                
-                                if is_arb:
-                                    opportunities.append({
-                                        'event': d_event['event'],
-                                        'market': d_market['name'],
-                                        'bookmaker1': {
-                                            'name': 'DraftKings',
-                                            'odds': d_market['odds'],
-                                            'stake': stakes['stake1']
-                                        },
-                                        'bookmaker2': {
-                                            'name': 'FanDuel',
-                                            'odds': f_market['odds'],
-                                            'stake': stakes['stake2']
-                                        },
-                                        'profit_percentage': profit,
-                                        'potential_profit': stakes['potential_profit'],
-                                        'timestamp': datetime.now().isoformat()
-                                    })
+        book_odds = {sport: {} for sport in sport_keys}
+        changed = {sport: set() for sport in sport_keys}
+        for book, outcome in zip(polled, results):
+            if isinstance(outcome, Exception):
+                # Back off this bookmaker alone and drop its odds rather than match against stale prices
+                delay = self._breakers[book].record_failure()
+                self.record_error(f"{BOOKMAKERS[book]} odds", outcome)
+                logging.warning("Pausing %s polling for %.0fs", BOOKMAKERS[book], delay)
+                for sport in sport_keys:
+                    changed[sport] |= self._ingest(book, sport, [], time.monotonic_ns())
+                continue
+            self._breakers[book].record_success()
+            for sport, (events, fetched_ns) in outcome.items():
+                book_odds[sport][book] = events
+                changed[sport] |= self._ingest(book, sport, events, fetched_ns)
         
-        for d_event in draftkings_odds:
-            for w_event in williamhill_odds:
-                if self._is_same_event(d_event, w_event):
-                    # Check each market combination
-                    for d_market in d_event['markets']:
-                        for w_market in w_event['markets']:
-                            if self._is_matching_market(d_market, w_market):
-                                is_arb, profit, stakes = self.calculate_arbitrage(
-                                    float(d_market['odds']),
-                                    float(w_market['odds'])
-                                )
-                                
-                                if is_arb:
-                                    opportunities.append({
-                                        'event': d_event['event'],
-                                        'market': d_market['name'],
-                                        'bookmaker1': {
-                                            'name': 'DraftKings',
-                                            'odds': d_market['odds'],
-                                            'stake': stakes['stake1']
-                                        },
-                                        'bookmaker2': {
-                                            'name': 'William Hill',
-                                            'odds': w_market['odds'],
-                                            'stake': stakes['stake2']
-                                        },
-                                        'profit_percentage': profit,
-                                        'potential_profit': stakes['potential_profit'],
-                                        'timestamp': datetime.now().isoformat()
-                                    })
+        if self._snapshot_writer is not None:
+            ts = time.time()
+            records = [{'sport': sport.name.lower(), 'ts': ts, 'odds': book_odds[sport]} for sport in sport_keys]
+            written = asyncio.get_running_loop().run_in_executor(self._snapshot_writer, self._write_snapshots, records)
+            written.add_done_callback(self._snapshots_written)
         
-        for f_event in fanduel_odds:
-            for w_event in williamhill_odds:
-                if self._is_same_event(f_event, w_event):
-                    # Check each market combination
-                    for f_market in f_event['markets']:
-                        for w_market in w_event['markets']:
-                            if self._is_matching_market(f_market, w_market):
-                                is_arb, profit, stakes = self.calculate_arbitrage(
-                                    float(f_market['odds']),
-                                    float(w_market['odds'])
-                                )
-                                
-                                if is_arb:
-                                    opportunities.append({
-                                        'event': f_event['event'],
-                                        'market': f_market['name'],
-                                        'bookmaker1': {
-                                            'name': 'FanDuel',
-                                            'odds': f_market['odds'],
-                                            'stake': stakes['stake1']
-                                        },
-                                        'bookmaker2': {
-                                            'name': 'William Hill',
-                                            'odds': w_market['odds'],
-                                            'stake': stakes['stake2']
-                                        },
-                                        'profit_percentage': profit,
-                                        'potential_profit': stakes['potential_profit'],
-                                        'timestamp': datetime.now().isoformat()
-                                    })
-        return opportunities
+        return {sport: self._recheck(changed[key]) for sport, key in zip(sports, sport_keys)}
+
+    async def execute_arbitrage(self, opportunity: Opportunity) -> bool:
+        """Execute the arbitrage opportunity by placing both bets at once"""
+        return (await self.execute_arbitrages([opportunity]))[0]
 
-    def execute_arbitrage(self, opportunity: Dict) -> bool:
-        """Execute the arbitrage opportunity by placing bets"""
-        bookmaker1 = opportunity['bookmaker1']['name'].lower()
-        bookmaker2 = opportunity['bookmaker2']['name'].lower()
+    async def execute_arbitrages(self, opportunities: List[Opportunity]) -> List[bool]:
+        """
+        Execute several arbitrage opportunities at once, sending each bookmaker's
+        bets in a single batch request where it has a batch endpoint
+        Returns: whether each opportunity was fully placed
+        """
+        # Group every leg's bet by bookmaker
+        pending_bets: Dict[str, List[Dict]] = defaultdict(list)
+        opportunity_legs = []
+        for opportunity in opportunities:
+            legs = ((opportunity.leg1.book, opportunity.bet_details(opportunity.leg1)),
+                    (opportunity.leg2.book, opportunity.bet_details(opportunity.leg2)))
+            missing = [book for book, _ in legs if book not in self._placers]
+            if missing:
+                logging.error("Bet placement not supported for %s, aborting arbitrage", missing[0])
+                opportunity_legs.append(None)
+                continue
+            for book, details in legs:
+                pending_bets[book].append(details)
+            opportunity_legs.append(legs)
         
-        # Place first bet
-        bet1_success = False
-        if hasattr(self, f'place_bet_{bookmaker1}'):
-            bet1_success = getattr(self, f'place_bet_{bookmaker1}')({
-                'event': opportunity['event'],
-                'market': opportunity['market'],
-                'odds': opportunity['bookmaker1']['odds'],
-                'stake': opportunity['bookmaker1']['stake']
-            })
+        # Place all bookmakers' bets concurrently so no line can move while another is in flight
+        books = list(pending_bets)
+        book_results = await asyncio.gather(*(
+            self._place_book_bets(book, pending_bets[book]) for book in books
+        ))
+        placed = {
+            details['idempotency_key']: result
+            for book, results in zip(books, book_results)
+            for details, result in zip(pending_bets[book], results)
+        }
         
-        if not bet1_success:
-            logging.error(f"Failed to place first bet with {bookmaker1}, aborting arbitrage")
+        return list(await asyncio.gather(*(
+            self._settle_arbitrage(opportunity, bets, placed)
+            for opportunity, bets in zip(opportunities, opportunity_legs)
+        )))
+
+    async def _place_book_bets(self, book: str, bets: List[Dict]) -> List:
+        """
+        Place one bookmaker's bets, through its batch placer if it has one
+        Returns: per bet, True, False, or the exception that left its outcome unknown
+        """
+        batch_placer = self._batch_placers.get(book)
+        if batch_placer is not None and len(bets) > 1:
+            try:
+                return await batch_placer(bets)
+            except Exception as e:
+                return [e] * len(bets)
+        placer = self._placers[book]
+        return await asyncio.gather(*(placer(bet) for bet in bets), return_exceptions=True)
+
+    async def _settle_arbitrage(self, opportunity: Opportunity, bets: Optional[Tuple], placed: Dict) -> bool:
+        """Check both legs of a placed arbitrage, rolling back if only part of it went through"""
+        if bets is None:
             return False
+        (bookmaker1, details1), (bookmaker2, details2) = bets
+        result1 = placed[details1['idempotency_key']]
+        result2 = placed[details2['idempotency_key']]
+        legs = ((bookmaker1, details1, result1), (bookmaker2, details2, result2))
+        for bookmaker, _, result in legs:
+            if isinstance(result, Exception):
+                logging.error("Unexpected error placing bet with %s: %s", bookmaker, result)
         
-        # Place second bet
-        bet2_success = False
-        if hasattr(self, f'place_bet_{bookmaker2}'):
-            bet2_success = getattr(self, f'place_bet_{bookmaker2}')({
-                'event': opportunity['event'],
-                'market': opportunity['market'],
-                'odds': opportunity['bookmaker2']['odds'],
-                'stake': opportunity['bookmaker2']['stake']
-            })
-        
-        if not bet2_success:
-            logging.error(f"Failed to place second bet with {bookmaker2}, attempting to cancel first bet")
-            # Here you would implement bet cancellation logic for the first bet
-            return False
+        if result1 is True and result2 is True:
+            logging.info("Successfully executed arbitrage opportunity: %s", _dumps(opportunity))
+            return True
         
-        logging.info(f"Successfully executed arbitrage opportunity: {opportunity}")
-        return True
+        if result1 is not True and result2 is not True:
+            logging.error("Failed to place bets with %s and %s, aborting arbitrage", bookmaker1, bookmaker2)
+        else:
+            logging.error("Only one leg placed with %s and %s, rolling back", bookmaker1, bookmaker2)
+        # Cancel every leg that was placed or may have been (an exception leaves the outcome unknown),
+        # concurrently, so no stake is left unhedged for longer than one round trip
+        await asyncio.gather(*(
+            self._rollback(bookmaker, details)
+            for bookmaker, details, result in legs
+            if result is True or isinstance(result, Exception)
+        ))
+        return False
 
-def main():
-    finder = ArbitrageFinder()
-    while True:
+    async def _rollback(self, book: str, bet_details: Dict):
+        """Cancel one leg of a failed arbitrage, flagging it loudly if the cancel does not go through"""
         try:
-            # Monitor popular sports
-            sports = ['football', 'tennis', 'basketball']
-            for sport in sports:
-                opportunities = finder.find_opportunities(sport)
-                for opportunity in opportunities:
-                    logging.info(f"Found opportunity: {opportunity}")
-                    if opportunity['profit_percentage'] >= finder.min_profit_threshold:
-                        finder.execute_arbitrage(opportunity)
-            
-            # Wait before next check
-            time.sleep(30)  # Check every 30 seconds
-            
+            cancelled = await self._cancellers[book](bet_details)
         except Exception as e:
-            logging.error(f"Error in main loop: {e}")
-            time.sleep(60)  # Wait longer if there's an error
+            logging.error("Unexpected error cancelling bet with %s: %s", book, e)
+            cancelled = False
+        if not cancelled:
+            logging.critical("Could not cancel bet with %s, position may be unhedged: %s", BOOKMAKERS[book], bet_details)
+
+    def _write_snapshots(self, records: List[Dict]):
+        """Append snapshot records to the snapshot file; runs on the snapshot writer thread"""
+        self._snapshot_file.write(b''.join(self._snapshot_packer.pack(record) for record in records))
+
+    def _snapshots_written(self, written: asyncio.Future):
+        """Count a failed snapshot write rather than let it pass unseen"""
+        if not written.cancelled() and written.exception() is not None:
+            self.record_error("odds snapshot", written.exception())
+
+    def close(self):
+        """Finish pending snapshot writes and release the snapshot file"""
+        if self._snapshot_writer is not None:
+            self._snapshot_writer.shutdown(wait=True)
+        if self._snapshot_file is not None:
+            self._snapshot_file.close()
+
+def read_odds_snapshots(path: str) -> Iterator[Dict]:
+    """Replay odds snapshots recorded through ODDS_SNAPSHOT_FILE"""
+    if os.path.getsize(path) == 0:
+        return
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        yield from msgpack.Unpacker(data, raw=False)
+
+async def handle_opportunities(finder: ArbitrageFinder, opportunities: List[Opportunity]):
+    """Log arbitrage opportunities and execute the profitable ones together"""
+    for opportunity in opportunities:
+        logging.info("Found opportunity: %s", _dumps(opportunity))
+    profitable = [
+        opportunity for opportunity in opportunities
+        if opportunity.profit_percentage >= finder.min_profit_threshold
+    ]
+    if profitable:
+        await finder.execute_arbitrages(profitable)
+
+async def watch_streams(finder: ArbitrageFinder):
+    """Act on opportunities as soon as streamed odds move, between polling ticks"""
+    async for opportunity in finder.watch_updates():
+        try:
+            await handle_opportunities(finder, [opportunity])
+        except Exception as e:
+            finder.record_error("streamed opportunity handling", e)
+
+async def main_async():
+    finder = ArbitrageFinder()
+    # Streaming feeds keep Pinnacle and Betfair odds in memory and push every change;
+    # polling below covers the bookmakers without a stream
+    tasks = [
+        asyncio.create_task(finder.stream_odds_pinnacle()),
+        asyncio.create_task(finder.stream_odds_betfair()),
+        asyncio.create_task(finder.name_betfair_runners()),
+        asyncio.create_task(watch_streams(finder)),
+        asyncio.create_task(finder.report_errors()),
+        asyncio.create_task(finder.prune_symbols())
+    ]
+    try:
+        while True:
+            # Ticks start every POLL_INTERVAL seconds however long the work inside takes
+            deadline = time.monotonic() + POLL_INTERVAL
+            try:
+                # Poll every sport in one pass while topping up the bet connections
+                opportunities, _ = await asyncio.gather(
+                    finder.find_opportunities_all(SPORTS),
+                    warm_bet_connections(finder.record_error)
+                )
+                
+                # Execute every sport's opportunities together so bets to the same bookmaker share a batch
+                await handle_opportunities(finder, [
+                    opportunity for sport in SPORTS for opportunity in opportunities[sport]
+                ])
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                finder.record_error("main loop", e)
+            except Exception:
+                logging.exception("Unexpected error in main loop")
+            
+            # Failing bookmakers back off on their own, so every tick waits for the same deadline
+            await asyncio.sleep(max(0.0, deadline - time.monotonic()))
+    finally:
+        for task in tasks:
+            task.cancel()
+        finder.close()
+        await close_session()
+
+def _pin_event_loop():
+    """Pin the event loop thread to the CPUs listed in CPU_AFFINITY, ideally those taking the NIC's interrupts"""
+    cpus = os.getenv('CPU_AFFINITY')
+    if not cpus:
+        return
+    if not hasattr(os, 'sched_setaffinity'):
+        logging.warning("CPU_AFFINITY is only supported on Linux, ignoring it")
+        return
+    try:
+        os.sched_setaffinity(0, {int(cpu) for cpu in cpus.split(',')})
+    except (ValueError, OSError) as e:
+        logging.error("Could not set CPU affinity to %s: %s", cpus, e)
+
+def _set_loop_policy():
+    """
+    Install the event loop policy named by EVENT_LOOP_POLICY ("module" or "module:Policy"),
+    e.g. an io_uring-backed loop, falling back to uvloop when available
+    """
+    name = os.getenv('EVENT_LOOP_POLICY')
+    if name:
+        module, _, attr = name.partition(':')
+        try:
+            policy = getattr(importlib.import_module(module), attr or 'EventLoopPolicy')
+            asyncio.set_event_loop_policy(policy())
+            return
+        except (ImportError, AttributeError) as e:
+            logging.error("Could not load event loop policy %s, using the default: %s", name, e)
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+
+def main():
+    _pin_event_loop()
+    _set_loop_policy()
+    # ijson silently falls back to a pure-Python parser when its C extension is missing
+    if ijson.backend != 'yajl2_c':
+        logging.warning("ijson is using its %s backend; odds parsing will be slow", ijson.backend)
+    asyncio.run(main_async())
 
 if __name__ == "__main__":
     main()